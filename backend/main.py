@@ -20,15 +20,18 @@ TCP-Protokoll (Newline-delimited JSON oder Plaintext):
 """
 
 import asyncio
-import json
 import logging
 import os
-import subprocess
-import threading
+import random
 import time
+from contextlib import contextmanager
+from functools import lru_cache
+from html import escape
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Callable, Dict, Iterable, Optional
 
+import httpx
+import orjson
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -41,6 +44,8 @@ logging.basicConfig(
 )
 log = logging.getLogger("stream-manager")
 
+_dumps = orjson.dumps   # liefert direkt bytes
+
 # ─── Config ───────────────────────────────────────────────────────────────────
 
 CONFIG_PATH = Path(os.getenv("CONFIG_PATH", "config.json"))
@@ -49,6 +54,9 @@ STATIC_DIR  = Path(os.getenv("STATIC_DIR",  "../frontend"))
 TCP_HOST    = os.getenv("TCP_HOST", "0.0.0.0")
 TCP_PORT    = int(os.getenv("TCP_PORT", "9000"))
 HTTP_PORT   = int(os.getenv("HTTP_PORT", "8080"))
+HLS_TMPFS   = os.getenv("HLS_TMPFS", "0") == "1"   # HLS_ROOT notfalls selbst als tmpfs mounten
+
+SSE_KEEPALIVE = 15   # s zwischen SSE-Keepalive-Kommentaren
 
 HLS_ROOT.mkdir(parents=True, exist_ok=True)
 
@@ -67,70 +75,245 @@ DEFAULT_CONFIG = {
 
 def load_config() -> dict:
     if CONFIG_PATH.exists():
-        with open(CONFIG_PATH) as f:
-            return json.load(f)
+        return orjson.loads(CONFIG_PATH.read_bytes())
     log.warning("No config.json found – using built-in default.")
     return DEFAULT_CONFIG
 
 
+def _fs_type(path: Path) -> str:
+    """Dateisystem-Typ des Mounts, auf dem ``path`` liegt (aus /proc/mounts)."""
+    path = str(path.resolve())
+    best, fstype = "", "unknown"
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                _, mnt, typ, *_ = line.split()
+                mnt = mnt.replace("\\040", " ")
+                if (path == mnt or path.startswith(mnt.rstrip("/") + "/")) and len(mnt) > len(best):
+                    best, fstype = mnt, typ
+    except OSError:
+        pass
+    return fstype
+
+
+async def ensure_hls_tmpfs():
+    """HLS-Segmente sollen im RAM liegen — Segment-Rotation ohne Disk-IO."""
+    fstype = _fs_type(HLS_ROOT)
+    if fstype in ("tmpfs", "ramfs"):
+        return
+    if not HLS_TMPFS:
+        log.warning(f"HLS_ROOT {HLS_ROOT} liegt auf {fstype}, nicht tmpfs (HLS_TMPFS=1 zum Mounten)")
+        return
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "mount", "-t", "tmpfs", "-o", "size=512m", "tmpfs", str(HLS_ROOT),
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, err = await proc.communicate()
+    except OSError as e:   # z.B. kein mount-Binary im PATH
+        log.error(f"tmpfs-Mount auf {HLS_ROOT} fehlgeschlagen: {e}")
+        return
+    if proc.returncode != 0:
+        log.error(f"tmpfs-Mount auf {HLS_ROOT} fehlgeschlagen: {err.decode(errors='replace').strip()}")
+    else:
+        log.info(f"tmpfs auf {HLS_ROOT} gemountet")
+
+
+# ─── Vollbild-View ────────────────────────────────────────────────────────────
+
+# Platzhalter: __SID__, __NAME__ (pro Kamera einmal ersetzt), __LIVE_MODE__ (pro Request)
+CAM_HTML = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8"/>
+<meta name="viewport" content="width=device-width, initial-scale=1.0"/>
+<title>__NAME__</title>
+<style>
+  * { margin:0; padding:0; box-sizing:border-box; }
+  html, body { width:100%; height:100%; background:#000; overflow:hidden; }
+  video { width:100%; height:100%; object-fit:cover; display:block; }
+  .wrap { position:relative; width:100%; height:100%; }
+  .standby, .live { position:absolute; inset:0; width:100%; height:100%; transition:opacity .15s; }
+  .standby { z-index:1; opacity:1; }
+  .live    { z-index:2; opacity:0; }
+  body.live-mode .live    { opacity:1; }
+  body.live-mode .standby { opacity:0; }
+</style>
+</head>
+<body class="__LIVE_MODE__">
+<div class="wrap">
+  <video class="standby" id="vsb" autoplay muted playsinline loop></video>
+  <video class="live"    id="vlv" autoplay muted playsinline></video>
+</div>
+<script src="https://cdnjs.cloudflare.com/ajax/libs/hls.js/1.4.12/hls.min.js"></script>
+<script>
+const STREAM_ID = "__SID__";
+
+// HLS Standby
+(function() {
+  const v = document.getElementById("vsb");
+  if (Hls.isSupported()) {
+    const h = new Hls({ manifestLoadingMaxRetry:999, fragLoadingMaxRetry:6 });
+    h.loadSource("/hls/" + STREAM_ID + "/standby/index.m3u8");
+    h.attachMedia(v);
+    h.on(Hls.Events.MANIFEST_PARSED, () => v.play().catch(()=>{}));
+  } else if (v.canPlayType("application/vnd.apple.mpegurl")) {
+    v.src = "/hls/" + STREAM_ID + "/standby/index.m3u8";
+    v.play().catch(()=>{});
+  }
+})();
+
+// WebRTC Live
+class WebRTCPlayer {
+  constructor(videoEl, streamName) {
+    this.video = videoEl; this.stream = streamName;
+    this.pc = null; this.active = false; this.retryTimer = null;
+  }
+  async start() { this.active = true; await this._connect(); }
+  stop() { this.active=false; clearTimeout(this.retryTimer); if(this.pc){this.pc.close();this.pc=null;} this.video.srcObject=null; }
+  async _connect() {
+    if (!this.active) return;
+    try {
+      const pc = new RTCPeerConnection({ iceServers:[{urls:"stun:stun.l.google.com:19302"}], bundlePolicy:"max-bundle" });
+      this.pc = pc;
+      pc.ontrack = e => { if(this.video.srcObject!==e.streams[0]){ this.video.srcObject=e.streams[0]; this.video.play().catch(()=>{}); } };
+      pc.oniceconnectionstatechange = () => { if(["disconnected","failed","closed"].includes(pc.iceConnectionState)) this._retry(); };
+      pc.addTransceiver("video",{direction:"recvonly"});
+      pc.addTransceiver("audio",{direction:"recvonly"});
+      const offer = await pc.createOffer();
+      await pc.setLocalDescription(offer);
+      await new Promise(res => {
+        if(pc.iceGatheringState==="complete"){res();return;}
+        pc.onicegatheringstatechange=()=>{if(pc.iceGatheringState==="complete")res();};
+        setTimeout(res,3000);
+      });
+      const resp = await fetch("/api/webrtc?src="+this.stream, {
+        method:"POST", headers:{"Content-Type":"application/sdp"}, body:pc.localDescription.sdp
+      });
+      if(!resp.ok) throw new Error("HTTP "+resp.status);
+      await pc.setRemoteDescription({type:"answer", sdp:await resp.text()});
+    } catch(e) { this._retry(); }
+  }
+  _retry() { if(!this.active)return; if(this.pc){this.pc.close();this.pc=null;} clearTimeout(this.retryTimer); this.retryTimer=setTimeout(()=>this._connect(),3000); }
+}
+
+const player = new WebRTCPlayer(document.getElementById("vlv"), STREAM_ID);
+player.start();
+
+// SSE — Modus-Updates
+const es = new EventSource("/api/streams/" + STREAM_ID + "/events");
+es.onmessage = e => {
+  const s = JSON.parse(e.data);
+  document.body.className = s.mode === "live" ? "live-mode" : "";
+};
+</script>
+</body>
+</html>""".encode()
+
+
 # ─── FFmpeg Worker (einzelner Prozess) ────────────────────────────────────────
 
+RESTART_BACKOFF_MIN  = 2    # s, Wartezeit vor dem ersten Neustart
+RESTART_BACKOFF_MAX  = 30   # s, Obergrenze bei dauerhaft fehlschlagendem FFmpeg
+RESTART_STABLE_AFTER = 60   # s Laufzeit, ab der ein Lauf als stabil gilt
+
 class FfmpegWorker:
-    """Startet und hält einen FFmpeg-Prozess dauerhaft am Leben."""
+    """Startet und hält einen FFmpeg-Prozess dauerhaft am Leben (asyncio-Task)."""
 
-    def __init__(self, name: str, cmd: list):
+    def __init__(self, name: str, cmd: Iterable[str], on_state: Optional[Callable[[], None]] = None):
         self.name     = name
-        self.cmd      = cmd
-        self._proc: Optional[subprocess.Popen] = None
+        self.cmd      = tuple(cmd)
+        self._cmd_str = " ".join(self.cmd)   # fürs Log, einmalig statt pro Neustart
+        self._on_state = on_state or (lambda: None)   # Prozess gestartet/beendet
+        self._proc: Optional[asyncio.subprocess.Process] = None
         self._running = False
-        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+        self._backoff = RESTART_BACKOFF_MIN
 
     def start(self):
         self._running = True
-        self._thread  = threading.Thread(target=self._loop, daemon=True, name=self.name)
-        self._thread.start()
+        self._task    = asyncio.create_task(self._supervisor(), name=self.name)
 
-    def stop(self):
+    async def stop(self):
         self._running = False
-        self._kill()
+        if self._task is None:
+            return
+        if self.alive():
+            self._proc.terminate()
+        else:
+            self._task.cancel()   # wartet gerade auf den nächsten Start
+        # asyncio.wait wirft nicht: Task-Abbruch bleibt intern, ein Abbruch von
+        # stop() selbst (z.B. beim Shutdown) wird aber weitergereicht
+        await asyncio.wait({self._task}, timeout=5)
+        if not self._task.done():
+            self._task.cancel()   # SIGTERM ignoriert → _run() killt im finally
+            await asyncio.wait({self._task})
+        if self._proc is not None and self._proc.returncode is None:
+            await self._proc.wait()   # nach kill() in _run() noch einsammeln
+        self._task = None
+        self._proc = None
 
     def alive(self) -> bool:
-        return self._proc is not None and self._proc.poll() is None
+        return self._proc is not None and self._proc.returncode is None
 
-    def _kill(self):
-        if self._proc and self._proc.poll() is None:
-            try:
-                self._proc.terminate()
-                self._proc.wait(timeout=5)
-            except Exception:
+    async def _run(self):
+        self._proc = await asyncio.create_subprocess_exec(
+            *self.cmd,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._on_state()
+        err_tail = bytearray()
+        drain = asyncio.create_task(self._drain_stderr(err_tail))
+        try:
+            await self._proc.wait()
+            await drain   # stderr-EOF folgt direkt auf das Prozessende
+            if self._running:
+                log.warning(f"[{self.name}] exited: {err_tail[-400:].decode(errors='replace')}")
+        finally:
+            drain.cancel()
+            # Abbruch (z.B. stop()-Timeout) → Prozess nicht verwaist zurücklassen
+            if self._proc.returncode is None:
                 self._proc.kill()
-        self._proc = None
 
-    def _loop(self):
+    async def _drain_stderr(self, tail: bytearray):
+        # Laufend leeren (sonst blockiert FFmpeg bei vollem Pipe-Puffer), nur das Ende behalten
+        while chunk := await self._proc.stderr.read(4096):
+            tail += chunk
+            del tail[:-4096]
+
+    async def _supervisor(self):
         while self._running:
-            log.info(f"[{self.name}] start: {' '.join(self.cmd)}")
+            log.info(f"[{self.name}] start: {self._cmd_str}")
+            started = time.monotonic()
             try:
-                self._proc = subprocess.Popen(
-                    self.cmd,
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.PIPE,
-                )
-                while self._running:
-                    try:
-                        self._proc.wait(timeout=1)
-                        err = self._proc.stderr.read().decode(errors="replace")
-                        log.warning(f"[{self.name}] exited: {err[-400:]}")
-                        break
-                    except subprocess.TimeoutExpired:
-                        continue
-                self._kill()
+                await self._run()
             except FileNotFoundError:
                 log.error(f"[{self.name}] ffmpeg not found!")
-                time.sleep(10)
+                await asyncio.sleep(10)
             except Exception as e:
                 log.error(f"[{self.name}] error: {e}")
-            if self._running:
-                time.sleep(2)
+            self._on_state()
+            if not self._running:
+                break
+            # lief der Prozess lange genug → Kamera/Quelle war ok, Backoff zurücksetzen
+            if time.monotonic() - started > RESTART_STABLE_AFTER:
+                self._backoff = RESTART_BACKOFF_MIN
+            # Jitter verhindert, dass alle Worker nach einem Ausfall gleichzeitig neu starten
+            await asyncio.sleep(self._backoff + random.random())
+            self._backoff = min(self._backoff * 2, RESTART_BACKOFF_MAX)
+
+
+# Während StreamManager.batch_notify(): Worker mit ausstehender Benachrichtigung
+_batch_pending: Optional[set] = None
+
+
+@lru_cache(maxsize=None)
+def _resolve_standby_video(path: str) -> str:
+    # Relativ zum Backend-Verzeichnis; meist teilen sich alle Kameras dasselbe Video
+    if os.path.isabs(path):
+        return path
+    return str(Path(__file__).parent / path)
 
 
 # ─── Stream Worker (dual: standby + live) ────────────────────────────────────
@@ -150,14 +333,13 @@ class StreamWorker:
         standby_video = cfg.get("standby_video", "standby/loop.mp4")
         seg_dur       = int(cfg.get("hls_segment_duration", 2))
 
-        if not os.path.isabs(standby_video):
-            standby_video = str(Path(__file__).parent / standby_video)
+        standby_video = _resolve_standby_video(standby_video)
 
         # HLS nur für Standby — Live läuft via go2rtc/WebRTC
         standby_dir = HLS_ROOT / self.id / "standby"
-        standby_dir.mkdir(parents=True, exist_ok=True)
+        self._standby_dir = standby_dir
 
-        standby_cmd = [
+        standby_cmd = (
             "ffmpeg", "-y", "-loglevel", "warning",
             "-stream_loop", "-1", "-re",
             "-i", standby_video,
@@ -171,74 +353,94 @@ class StreamWorker:
             "-hls_flags", "delete_segments+append_list+independent_segments+split_by_time",
             "-hls_segment_filename", str(standby_dir / "seg%05d.ts"),
             str(standby_dir / "index.m3u8"),
-        ]
+        )
 
-        self._standby_worker = FfmpegWorker(f"{self.id}/standby", standby_cmd)
+        self._standby_worker = FfmpegWorker(
+            f"{self.id}/standby", standby_cmd, on_state=self._on_standby_state,
+        )
+
+        # Vollbild-Seite vorgerendert, pro Request nur noch die body-Klasse
+        self._html_template: bytes = (
+            CAM_HTML
+            .replace(b"__SID__", self.id.encode())
+            .replace(b"__NAME__", escape(self.name).encode())
+        )
 
         self._mode = "standby"
-        self._lock = threading.Lock()
-        self._subscribers: set = set()   # asyncio.Queue per SSE-Client
+        self._rev   = 0                  # zählt Modus-Wechsel; SSE-Clients vergleichen nur
+        self._event = asyncio.Event()    # weckt alle wartenden SSE-Clients auf einmal
+
+        # Status wird nur bei Modus-/Prozesswechsel neu aufgebaut, nie pro Abfrage
+        self._status_cache: dict = {
+            "id":          self.id,
+            "name":        self.name,
+            "mode":        self._mode,
+            "standby_url": f"/hls/{self.id}/standby/index.m3u8",
+            "webrtc_src":  self.id,   # go2rtc stream name
+            "standby_ok":  False,
+        }
+        self._status_json:  bytes = b""  # _status_cache als JSON, geteilt von SSE, TCP und REST
+        self._status_frame: bytes = b""  # fertiger SSE-Frame, geteilt von allen Clients
+        self._rebuild_frame()
 
     # ── public ────────────────────────────────────────────────────────────────
 
     def start(self):
+        # erst hier anlegen: HLS_ROOT kann in startup() frisch als tmpfs gemountet sein
+        self._standby_dir.mkdir(parents=True, exist_ok=True)
         self._standby_worker.start()
         log.info(f"[{self.id}] Standby-Worker gestartet (Live via go2rtc/WebRTC)")
 
-    def stop(self):
-        self._standby_worker.stop()
+    async def stop(self):
+        await self._standby_worker.stop()
 
     @property
     def mode(self) -> str:
         return self._mode
 
     def set_live(self):
-        with self._lock:
-            if self._mode != "live":
-                self._mode = "live"
-                log.info(f"[{self.id}] → LIVE")
-                self._notify()
+        self._set_mode("live")
 
     def set_standby(self):
-        with self._lock:
-            if self._mode != "standby":
-                self._mode = "standby"
-                log.info(f"[{self.id}] → STANDBY")
-                self._notify()
+        self._set_mode("standby")
 
     def toggle(self):
-        if self._mode == "standby":
-            self.set_live()
-        else:
-            self.set_standby()
-
-    def status(self) -> dict:
-        return {
-            "id":          self.id,
-            "name":        self.name,
-            "mode":        self._mode,
-            "standby_url": f"/hls/{self.id}/standby/index.m3u8",
-            "webrtc_src":  self.id,   # go2rtc stream name
-            "standby_ok":  self._standby_worker.alive(),
-        }
+        mode = self._mode   # einmal lesen, dann Gegenteil setzen
+        self._set_mode("live" if mode == "standby" else "standby")
+
+    def _set_mode(self, mode: str):
+        # Vergleich + Zuweisung reichen: alle Aufrufer laufen im selben Event-Loop
+        if self._mode == mode:
+            return
+        self._mode = mode
+        self._status_cache["mode"] = mode
+        log.info(f"[{self.id}] → {mode.upper()}")
+        self._notify()
+
+    def _on_standby_state(self):
+        self._status_cache["standby_ok"] = self._standby_worker.alive()
+        self._rebuild_frame()
 
     # ── SSE ───────────────────────────────────────────────────────────────────
 
-    def subscribe(self) -> asyncio.Queue:
-        q: asyncio.Queue = asyncio.Queue(maxsize=20)
-        self._subscribers.add(q)
-        return q
-
-    def unsubscribe(self, q: asyncio.Queue):
-        self._subscribers.discard(q)
+    def _rebuild_frame(self):
+        self._status_json  = _dumps(self._status_cache)
+        self._status_frame = b"data: " + self._status_json + b"\n\n"
 
     def _notify(self):
-        payload = json.dumps(self.status())
-        for q in list(self._subscribers):
-            try:
-                q.put_nowait(payload)
-            except asyncio.QueueFull:
-                pass
+        if _batch_pending is not None:   # innerhalb StreamManager.batch_notify()
+            _batch_pending.add(self)
+            return
+        self._flush()
+
+    def _flush(self):
+        self._rebuild_frame()
+        self._rev += 1
+        self._wake()
+
+    def _wake(self):
+        self._event.set()    # bereits wartende Clients sind damit geweckt
+        self._event.clear()
 
 
 # ─── Stream Manager ───────────────────────────────────────────────────────────
@@ -254,19 +456,49 @@ class StreamManager:
         for w in self.workers.values():
             w.start()
 
-    def stop_all(self):
-        for w in self.workers.values():
-            w.stop()
+    async def stop_all(self):
+        await asyncio.gather(*(w.stop() for w in self.workers.values()))
 
     def get(self, sid: str) -> Optional[StreamWorker]:
         return self.workers.get(sid)
 
-    def all_status(self) -> list:
-        return [w.status() for w in self.workers.values()]
+    def all_status_json(self) -> bytes:
+        return b"[" + b",".join(w._status_json for w in self.workers.values()) + b"]"
+
+    @contextmanager
+    def batch_notify(self):
+        """Sammelt Modus-Wechsel und benachrichtigt jeden Worker am Ende nur einmal."""
+        global _batch_pending
+        if _batch_pending is not None:   # verschachtelt → äußerer Block flusht
+            yield
+            return
+        _batch_pending = set()
+        try:
+            yield
+        finally:
+            pending, _batch_pending = _batch_pending, None
+            for w in pending:
+                w._flush()
 
 
 # ─── TCP Command Server ────────────────────────────────────────────────────────
 
+_TCP_ACTIONS = {
+    "live":    StreamWorker.set_live,
+    "standby": StreamWorker.set_standby,
+    "toggle":  StreamWorker.toggle,
+}
+
+
+def _streams_response(workers: Iterable[StreamWorker]) -> bytes:
+    # Fügt die vorberechneten Status-JSONs zusammen, ohne neu zu serialisieren
+    return b'{"streams":[' + b",".join(w._status_json for w in workers) + b"]}\n"
+
+
+def _error_response(msg: str) -> bytes:
+    return _dumps({"error": msg}) + b"\n"
+
+
 async def handle_tcp_client(
     reader: asyncio.StreamReader,
     writer: asyncio.StreamWriter,
@@ -279,42 +511,48 @@ async def handle_tcp_client(
             data = await reader.readline()
             if not data:
                 break
-            line = data.decode().strip()
+            line = data.strip()
             if not line:
                 continue
-            log.info(f"TCP [{addr}] ← {line}")
+            log.info(f"TCP [{addr}] ← {line.decode(errors='replace')}")
 
-            # JSON oder Plaintext parsen
-            try:
-                cmd = json.loads(line)
-            except json.JSONDecodeError:
-                parts = line.split()
-                cmd = {"action": parts[0], "stream": parts[1] if len(parts) > 1 else ""}
-
-            action    = cmd.get("action", "").lower()
-            stream_id = cmd.get("stream", "")
+            # JSON oder Plaintext parsen — Plaintext direkt auf den Bytes
+            if line[:1] == b"{":
+                try:
+                    cmd = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    writer.write(_error_response("invalid json"))
+                    await writer.drain()
+                    continue
+                action    = str(cmd.get("action", "")).lower()
+                stream_id = cmd.get("stream", "")
+            else:
+                parts     = line.split(None, 2)
+                action    = parts[0].decode(errors="replace").lower()
+                stream_id = parts[1].decode(errors="replace") if len(parts) > 1 else ""
 
             if action == "status":
-                response = {"streams": manager.all_status()}
-
-            elif action in ("live", "standby", "toggle"):
-                targets = (
-                    list(manager.workers.values())
-                    if stream_id in ("*", "")
-                    else ([w] if (w := manager.get(stream_id)) else [])
-                )
-                if not targets and stream_id not in ("*", ""):
-                    response = {"error": f"unknown stream: {stream_id}"}
+                response = _streams_response(manager.workers.values())
+
+            elif action in _TCP_ACTIONS:
+                if stream_id in ("*", ""):
+                    targets = manager.workers.values()   # View, keine Listen-Kopie
+                elif w := manager.get(stream_id):
+                    targets = (w,)
+                else:
+                    targets = None
+                if targets is None:
+                    response = _error_response(f"unknown stream: {stream_id}")
                 else:
-                    for w in targets:
-                        if action == "live":      w.set_live()
-                        elif action == "standby": w.set_standby()
-                        elif action == "toggle":  w.toggle()
-                    response = {"streams": [w.status() for w in targets]}
+                    apply = _TCP_ACTIONS[action]
+                    with manager.batch_notify():
+                        for w in targets:
+                            apply(w)
+                    response = _streams_response(targets)
             else:
-                response = {"error": f"unknown action: {action}"}
+                response = _error_response(f"unknown action: {action}")
 
-            writer.write((json.dumps(response) + "\n").encode())
+            writer.write(response)
             await writer.drain()
 
     except asyncio.IncompleteReadError:
@@ -336,6 +574,24 @@ async def start_tcp_server(manager: StreamManager):
         await srv.serve_forever()
 
 
+# ─── HLS-Auslieferung ─────────────────────────────────────────────────────────
+
+HLS_MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts":   "video/mp2t",
+}
+
+
+class HlsFileResponse(FileResponse):
+    """
+    FileResponse für HLS-Dateien mit 1-MiB-Chunks, sodass ein Segment in einem
+    read()/send() statt in 64-KiB-Häppchen läuft. Kein sendfile(): uvicorn
+    bietet keinen Zero-Copy-Versand an, jedes Byte geht durch Python.
+    """
+
+    chunk_size = 1024 * 1024
+
+
 # ─── FastAPI ───────────────────────────────────────────────────────────────────
 
 config  = load_config()
@@ -348,7 +604,12 @@ app.add_middleware(
 )
 
 # HLS-Segmente
-app.mount("/hls", StaticFiles(directory=str(HLS_ROOT)), name="hls")
+@app.api_route("/hls/{path:path}", methods=["GET", "HEAD"])
+async def hls_file(path: str):
+    f = (HLS_ROOT / path).resolve()
+    if HLS_ROOT.resolve() not in f.parents or not f.is_file():
+        raise HTTPException(404)
+    return HlsFileResponse(f, media_type=HLS_MEDIA_TYPES.get(f.suffix))
 
 # Frontend
 if STATIC_DIR.exists():
@@ -361,19 +622,16 @@ if STATIC_DIR.exists():
 
 GO2RTC_URL = os.getenv("GO2RTC_URL", "http://172.17.0.1:1984")  # Docker host IP
 
+# Geteilter Client (Keep-Alive zu go2rtc) — wird in startup() angelegt
+HTTPX_CLIENT: Optional[httpx.AsyncClient] = None
+SDP_HEADERS = {"Content-Type": "application/sdp"}
+
 # WebRTC Proxy — vermeidet CORS, Browser spricht nur Port 8080
 @app.post("/api/webrtc")
 async def webrtc_proxy(request: Request):
-    import httpx
     src = request.query_params.get("src", "")
     body = await request.body()
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            f"{GO2RTC_URL}/api/webrtc?src={src}",
-            content=body,
-            headers={"Content-Type": "application/sdp"},
-            timeout=10,
-        )
+    resp = await HTTPX_CLIENT.post("/api/webrtc", params={"src": src}, content=body, headers=SDP_HEADERS)
     return Response(
         content=resp.content,
         status_code=resp.status_code,
@@ -385,124 +643,42 @@ async def webrtc_proxy(request: Request):
 async def cam_fullscreen(sid: str, request: Request):
     w = manager.get("cam" + sid)
     if not w: raise HTTPException(404, f"Stream cam{sid} nicht gefunden")
-    s = w.status()
-    html = f"""<!DOCTYPE html>
-<html>
-<head>
-<meta charset="UTF-8"/>
-<meta name="viewport" content="width=device-width, initial-scale=1.0"/>
-<title>{s["name"]}</title>
-<style>
-  * {{ margin:0; padding:0; box-sizing:border-box; }}
-  html, body {{ width:100%; height:100%; background:#000; overflow:hidden; }}
-  video {{ width:100%; height:100%; object-fit:cover; display:block; }}
-  .wrap {{ position:relative; width:100%; height:100%; }}
-  .standby, .live {{ position:absolute; inset:0; width:100%; height:100%; transition:opacity .15s; }}
-  .standby {{ z-index:1; opacity:1; }}
-  .live    {{ z-index:2; opacity:0; }}
-  body.live-mode .live    {{ opacity:1; }}
-  body.live-mode .standby {{ opacity:0; }}
-</style>
-</head>
-<body class="{"live-mode" if s["mode"] == "live" else ""}">
-<div class="wrap">
-  <video class="standby" id="vsb" autoplay muted playsinline loop></video>
-  <video class="live"    id="vlv" autoplay muted playsinline></video>
-</div>
-<script src="https://cdnjs.cloudflare.com/ajax/libs/hls.js/1.4.12/hls.min.js"></script>
-<script>
-const STREAM_ID = "cam{sid}";
-
-// HLS Standby
-(function() {{
-  const v = document.getElementById("vsb");
-  if (Hls.isSupported()) {{
-    const h = new Hls({{ manifestLoadingMaxRetry:999, fragLoadingMaxRetry:6 }});
-    h.loadSource("/hls/" + STREAM_ID + "/standby/index.m3u8");
-    h.attachMedia(v);
-    h.on(Hls.Events.MANIFEST_PARSED, () => v.play().catch(()=>{{}}));
-  }} else if (v.canPlayType("application/vnd.apple.mpegurl")) {{
-    v.src = "/hls/" + STREAM_ID + "/standby/index.m3u8";
-    v.play().catch(()=>{{}});
-  }}
-}})();
-
-// WebRTC Live
-class WebRTCPlayer {{
-  constructor(videoEl, streamName) {{
-    this.video = videoEl; this.stream = streamName;
-    this.pc = null; this.active = false; this.retryTimer = null;
-  }}
-  async start() {{ this.active = true; await this._connect(); }}
-  stop() {{ this.active=false; clearTimeout(this.retryTimer); if(this.pc){{this.pc.close();this.pc=null;}} this.video.srcObject=null; }}
-  async _connect() {{
-    if (!this.active) return;
-    try {{
-      const pc = new RTCPeerConnection({{ iceServers:[{{urls:"stun:stun.l.google.com:19302"}}], bundlePolicy:"max-bundle" }});
-      this.pc = pc;
-      pc.ontrack = e => {{ if(this.video.srcObject!==e.streams[0]){{ this.video.srcObject=e.streams[0]; this.video.play().catch(()=>{{}}); }} }};
-      pc.oniceconnectionstatechange = () => {{ if(["disconnected","failed","closed"].includes(pc.iceConnectionState)) this._retry(); }};
-      pc.addTransceiver("video",{{direction:"recvonly"}});
-      pc.addTransceiver("audio",{{direction:"recvonly"}});
-      const offer = await pc.createOffer();
-      await pc.setLocalDescription(offer);
-      await new Promise(res => {{
-        if(pc.iceGatheringState==="complete"){{res();return;}}
-        pc.onicegatheringstatechange=()=>{{if(pc.iceGatheringState==="complete")res();}};
-        setTimeout(res,3000);
-      }});
-      const resp = await fetch("/api/webrtc?src="+this.stream, {{
-        method:"POST", headers:{{"Content-Type":"application/sdp"}}, body:pc.localDescription.sdp
-      }});
-      if(!resp.ok) throw new Error("HTTP "+resp.status);
-      await pc.setRemoteDescription({{type:"answer", sdp:await resp.text()}});
-    }} catch(e) {{ this._retry(); }}
-  }}
-  _retry() {{ if(!this.active)return; if(this.pc){{this.pc.close();this.pc=null;}} clearTimeout(this.retryTimer); this.retryTimer=setTimeout(()=>this._connect(),3000); }}
-}}
-
-const player = new WebRTCPlayer(document.getElementById("vlv"), STREAM_ID);
-player.start();
-
-// SSE — Modus-Updates
-const es = new EventSource("/api/streams/" + STREAM_ID + "/events");
-es.onmessage = e => {{
-  const s = JSON.parse(e.data);
-  document.body.className = s.mode === "live" ? "live-mode" : "";
-}};
-</script>
-</body>
-</html>"""
+    html = w._html_template.replace(
+        b"__LIVE_MODE__", b"live-mode" if w.mode == "live" else b""
+    )
     return HTMLResponse(html)
 
 # REST API
+def _status_response(w: StreamWorker) -> Response:
+    return Response(w._status_json, media_type="application/json")
+
 @app.get("/api/streams")
 async def api_streams():
-    return manager.all_status()
+    return Response(manager.all_status_json(), media_type="application/json")
 
 @app.get("/api/streams/{sid}")
 async def api_stream(sid: str):
     w = manager.get(sid)
     if not w: raise HTTPException(404)
-    return w.status()
+    return _status_response(w)
 
 @app.post("/api/streams/{sid}/live")
 async def api_live(sid: str):
     w = manager.get(sid)
     if not w: raise HTTPException(404)
-    w.set_live(); return w.status()
+    w.set_live(); return _status_response(w)
 
 @app.post("/api/streams/{sid}/standby")
 async def api_standby(sid: str):
     w = manager.get(sid)
     if not w: raise HTTPException(404)
-    w.set_standby(); return w.status()
+    w.set_standby(); return _status_response(w)
 
 @app.post("/api/streams/{sid}/toggle")
 async def api_toggle(sid: str):
     w = manager.get(sid)
     if not w: raise HTTPException(404)
-    w.toggle(); return w.status()
+    w.toggle(); return _status_response(w)
 
 
 # Server-Sent Events — sofortiger Push bei Modus-Wechsel (kein Polling nötig)
@@ -511,22 +687,21 @@ async def api_events(sid: str, request: Request):
     w = manager.get(sid)
     if not w: raise HTTPException(404)
 
-    q = w.subscribe()
-
     async def generator():
-        yield f"data: {json.dumps(w.status())}\n\n"   # Sofort-Status
-        try:
-            while True:
-                if await request.is_disconnected():
-                    break
-                try:
-                    payload = await asyncio.wait_for(q.get(), timeout=15)
-                    yield f"data: {payload}\n\n"
-                except asyncio.TimeoutError:
-                    yield ": keepalive\n\n"
-        finally:
-            w.unsubscribe(q)
+        last = -1
+        while True:
+            if await request.is_disconnected():
+                break
+            if w._rev != last:   # Sofort-Status bzw. neuer Modus
+                last = w._rev
+                yield w._status_frame
+                continue
+            await w._event.wait()
+            if w._rev == last:   # kein Modus-Wechsel → Weckruf von sse_keepalive()
+                yield b": keepalive\n\n"
 
+    # Kein NODELAY-Middleware nötig: uvicorns asyncio-/uvloop-Transports schalten
+    # Nagle für jede TCP-Verbindung ab, SSE-Frames gehen sofort raus.
     return StreamingResponse(
         generator(),
         media_type="text/event-stream",
@@ -534,16 +709,37 @@ async def api_events(sid: str, request: Request):
     )
 
 
+async def sse_keepalive(manager: StreamManager):
+    # Ein gemeinsamer Timer für alle SSE-Clients statt eines wait_for-Timeouts pro Client
+    while True:
+        await asyncio.sleep(SSE_KEEPALIVE)
+        for w in manager.workers.values():
+            w._wake()
+
+
 # ─── Lifecycle ────────────────────────────────────────────────────────────────
 
 @app.on_event("startup")
 async def startup():
+    global HTTPX_CLIENT
+    HTTPX_CLIENT = httpx.AsyncClient(
+        base_url=GO2RTC_URL,
+        timeout=10,
+        limits=httpx.Limits(max_keepalive_connections=32),
+    )
+    await ensure_hls_tmpfs()
     manager.start_all()
     asyncio.create_task(start_tcp_server(manager))
+    asyncio.create_task(sse_keepalive(manager))
 
 @app.on_event("shutdown")
 async def shutdown():
-    manager.stop_all()
+    await manager.stop_all()
+    await HTTPX_CLIENT.aclose()
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=HTTP_PORT, reload=False)
+    # Ein Prozess: SSE-/Modus-Zustand lebt im Speicher dieses Workers
+    uvicorn.run(
+        "main:app", host="0.0.0.0", port=HTTP_PORT,
+        loop="uvloop", http="httptools", workers=1, reload=False,
+    )